@@ -1,24 +1,74 @@
 import os
 import sys
 import io
-import json
+import orjson
+import pickle
+import shutil
 import hashlib
+import functools
+import mmap
 from pathlib import Path
 from datetime import datetime
 import glob
 import warnings
 import logging
-from typing import Dict, Any, Tuple
+import threading
+import math
+import tempfile
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Any, List, Tuple
 
 # Clean up environment to suppress warnings/logs
-sys.stderr = io.StringIO()
+# SILENCE_NATIVE_STDERR=1 points fd 2 at /dev/null so output from C/C++
+# extensions is dropped by the kernel; Python's sys.stderr keeps a duplicate
+# of the original stream so tracebacks and shell redirection still work.
+if os.getenv("SILENCE_NATIVE_STDERR") == "1":
+    _stderr_fd = os.dup(2)
+    _devnull_fd = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(_devnull_fd, 2)
+    os.close(_devnull_fd)
+    sys.stderr = os.fdopen(_stderr_fd, "w", buffering=1)
 os.environ["USER_AGENT"] = "Mozilla/5.0 (compatible; YourBot/1.0)"
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
 
+# Size OpenMP/MKL pools to this worker's share of the CPUs, before torch/faiss
+# load, so `uvicorn --workers N` doesn't start N x cpu_count threads
+_WORKER_THREADS = max(1, (os.cpu_count() or 1) // max(1, int(os.environ.get("WEB_CONCURRENCY", "1"))))
+os.environ.setdefault("OMP_NUM_THREADS", str(_WORKER_THREADS))
+os.environ.setdefault("MKL_NUM_THREADS", str(_WORKER_THREADS))
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
-from langchain_community.document_loaders import PyPDFLoader
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.documents import Document
+from pypdf import PdfReader
+import faiss
+
+faiss.omp_set_num_threads(int(os.environ["OMP_NUM_THREADS"]))
+
+# Optional Rust-backed splitter; falls back to LangChain's pure-Python splitter
+try:
+    from semantic_text_splitter import TextSplitter as RustTextSplitter
+except ImportError:
+    RustTextSplitter = None
+
+# Optional cross-process build lock (POSIX only); without it, builds are only
+# serialized between threads of one process
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Optional parquet docstore (needs pyarrow); index.pkl is always written too
+try:
+    import parquet_docstore
+except ImportError:
+    parquet_docstore = None
+
+from retrieval import MMAP_READ_FLAGS, build_retrieval_arrays, save_retrieval_files
 
 # ----------------------------
 # CLEAN TERMINAL OUTPUT
@@ -32,53 +82,215 @@ logging.getLogger("PyPDF2").setLevel(logging.ERROR)
 CURRICULUM_ROOT = "curriculum_data"
 VECTORSTORE_ROOT = "vectorstores"
 METADATA_FILE = "vectorstore_metadata.json"
+DOCSTORE_FILE = "docstore.parquet"
+
+# Chunking (characters)
+CHUNK_SIZE = 1000
+CHUNK_MIN_SIZE = 800
+CHUNK_OVERLAP = 200
+
+# Token-based chunking with the embedding model's tokenizer (opt-in)
+TOKEN_AWARE_SPLITTING = os.getenv("TOKEN_AWARE_SPLITTING") == "1"
+CHUNK_TOKENS = 256
+CHUNK_OVERLAP_TOKENS = 50
+
+# PDF pages handed to each extraction worker process
+PDF_PAGES_PER_WORKER = 8
+
+# FAISS index layout. Vectors are stored as fp16 (half the memory of the
+# default flat fp32 index); large corpora additionally get an IVF coarse
+# quantizer so queries only scan a few inverted lists.
+IVF_MIN_CHUNKS = 10000
+IVF_NPROBE = 8
+
+# BGE vectors are unit-normalized, so inner product ranks like cosine
+# similarity and is cheaper per comparison than L2
+DISTANCE_STRATEGY = DistanceStrategy.MAX_INNER_PRODUCT
+
+# Embedding model. Set EMBEDDINGS_ONNX_DIR to an int8-quantized ONNX export of
+# the same model to run inference through ONNX Runtime instead of PyTorch.
+EMBEDDING_MODEL = "BAAI/bge-small-en-v1.5"
+EMBEDDINGS_ONNX_DIR = os.getenv("EMBEDDINGS_ONNX_DIR")
+EMBED_BATCH_SIZE = 128
+# Set EMBEDDINGS_COMPILE=1 to fuse/compile the PyTorch model at startup
+EMBEDDINGS_COMPILE = os.getenv("EMBEDDINGS_COMPILE") == "1"
+
+# Settings baked into a built index; a change forces a rebuild
+INDEX_CONFIG = {
+    "quantizer": "SQfp16",
+    "distance_strategy": DISTANCE_STRATEGY.value,
+    "embedding_model": EMBEDDING_MODEL,
+    "embedding_backend": "onnx" if EMBEDDINGS_ONNX_DIR else "torch",
+    "splitter": (
+        "token-offsets" if TOKEN_AWARE_SPLITTING
+        else "semantic-text-splitter" if RustTextSplitter
+        else "recursive-character"
+    ),
+}
 
 # Global dictionary to hold all initialized vectorstores
 GLOBAL_VECTORSTORES: Dict[str, Any] = {}
+_VECTORSTORES_LOCK = threading.Lock()
+
+# Parsed metadata per subject; refreshed whenever metadata is written
+_METADATA_CACHE: Dict[str, Dict[str, Any]] = {}
 
 # ----------------------------
 # METADATA MANAGEMENT
 # ----------------------------
 def get_folder_hash(folder_path):
     """Generate hash of all PDFs in a subject folder."""
-    hash_md5 = hashlib.md5()
+    # SHA-256 goes through OpenSSL (SHA-NI where the CPU has it); each file is
+    # mmapped and hashed in one update() call instead of looping over small reads.
+    file_hash = hashlib.sha256()
     pdf_files = sorted(glob.glob(os.path.join(folder_path, "*.pdf")))
     
     for pdf_path in pdf_files:
-        hash_md5.update(Path(pdf_path).name.encode())
-        if os.path.exists(pdf_path):
-            with open(pdf_path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_md5.update(chunk)
-    return hash_md5.hexdigest()
+        file_hash.update(Path(pdf_path).name.encode())
+        if os.path.exists(pdf_path) and os.path.getsize(pdf_path) > 0:
+            with open(pdf_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                file_hash.update(mm)
+    return file_hash.hexdigest()
+
+def get_folder_stats(folder_path):
+    """Return (name, mtime_ns, size) for every PDF in a subject folder."""
+    pdf_files = sorted(glob.glob(os.path.join(folder_path, "*.pdf")))
+    stats = []
+    for pdf_path in pdf_files:
+        st = os.stat(pdf_path)
+        stats.append([Path(pdf_path).name, st.st_mtime_ns, st.st_size])
+    return stats
+
+def get_vectorstore_path(subject_name) -> Path:
+    """Directory holding a subject's saved vectorstore files."""
+    return Path(VECTORSTORE_ROOT) / f"{subject_name}_faiss"
 
 def get_metadata(subject_name):
     """Load or initialize metadata for a specific subject's vectorstore"""
+    if subject_name in _METADATA_CACHE:
+        return _METADATA_CACHE[subject_name]
+
     metadata_path = Path(VECTORSTORE_ROOT) / f"{subject_name}_faiss" / METADATA_FILE
     if metadata_path.exists():
         try:
-            with open(metadata_path, 'r') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
+            with open(metadata_path, 'rb') as f:
+                metadata = orjson.loads(f.read())
+        except orjson.JSONDecodeError:
             return {}
+        _METADATA_CACHE[subject_name] = metadata
+        return metadata
     return {}
 
-def save_metadata(subject_name, files_hash, num_documents, num_chunks):
-    """Save metadata after a successful build"""
-    subject_faiss_dir = Path(VECTORSTORE_ROOT) / f"{subject_name}_faiss"
-    metadata_path = subject_faiss_dir / METADATA_FILE
-    
-    metadata = {
+def build_metadata(files_hash, num_documents, num_chunks, file_stats=None):
+    """Create the metadata dict describing a build"""
+    return {
         "file_hash": files_hash,
+        "index_config": INDEX_CONFIG,
+        "file_stats": file_stats if file_stats is not None else [],
         "num_documents": num_documents,
         "num_chunks": num_chunks,
         "last_build": datetime.now().isoformat()
     }
+
+def save_metadata(subject_name, files_hash, num_documents, num_chunks, file_stats=None):
+    """Save metadata after a successful build"""
+    metadata = build_metadata(files_hash, num_documents, num_chunks, file_stats)
+    write_metadata(subject_name, metadata)
+    return metadata
+
+def _write_metadata_file(metadata_path, metadata):
+    """Write metadata JSON and flush it to disk."""
+    with open(metadata_path, 'wb') as f:
+        f.write(orjson.dumps(metadata, option=orjson.OPT_INDENT_2))
+        f.flush()
+        os.fsync(f.fileno())
+
+def write_metadata(subject_name, metadata):
+    """Write a subject's metadata dict to disk."""
+    subject_faiss_dir = Path(VECTORSTORE_ROOT) / f"{subject_name}_faiss"
+    metadata_path = subject_faiss_dir / METADATA_FILE
+
     # Ensure the subject's vectorstore path exists before saving metadata
     subject_faiss_dir.mkdir(parents=True, exist_ok=True)
-    with open(metadata_path, 'w') as f:
-        json.dump(metadata, f, indent=4)
-    return metadata
+    # Unique temp name so concurrent writers never share a file
+    fd, tmp_path = tempfile.mkstemp(dir=subject_faiss_dir, prefix=METADATA_FILE + ".")
+    os.close(fd)
+    try:
+        _write_metadata_file(tmp_path, metadata)
+        os.replace(tmp_path, metadata_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+    _METADATA_CACHE[subject_name] = metadata
+
+def save_vectorstore(subject_name, vectorstore, metadata):
+    """Persist a vectorstore and its metadata without leaving a torn state.
+
+    Everything is written to a unique sibling temp directory first and then
+    moved into place with os.replace. The metadata file is moved last, so an
+    interrupted save is detected as a hash/settings mismatch on next start.
+    """
+    subject_faiss_dir = Path(VECTORSTORE_ROOT) / f"{subject_name}_faiss"
+    Path(VECTORSTORE_ROOT).mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(dir=VECTORSTORE_ROOT, prefix=f"{subject_name}_faiss."))
+    try:
+        # Decode the retrieval arrays first: for IVF indexes this builds a direct
+        # map, which must not mutate the index while save_local writes it
+        retrieval_arrays = build_retrieval_arrays(vectorstore)
+
+        # faiss.write_index releases the GIL, so the other writes overlap with it
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            futures = [
+                pool.submit(vectorstore.save_local, str(tmp_dir)),
+                pool.submit(_write_metadata_file, tmp_dir / METADATA_FILE, metadata),
+                pool.submit(save_retrieval_files, retrieval_arrays, tmp_dir),
+            ]
+            if parquet_docstore is not None:
+                futures.append(pool.submit(
+                    parquet_docstore.write_docstore,
+                    tmp_dir / DOCSTORE_FILE,
+                    vectorstore.docstore,
+                    vectorstore.index_to_docstore_id
+                ))
+            for future in futures:
+                future.result()
+
+        index_files = [p.name for p in tmp_dir.iterdir() if p.name != METADATA_FILE]
+        for name in index_files:
+            with open(tmp_dir / name, "rb") as f:
+                os.fsync(f.fileno())
+
+        subject_faiss_dir.mkdir(parents=True, exist_ok=True)
+        for name in index_files + [METADATA_FILE]:
+            os.replace(tmp_dir / name, subject_faiss_dir / name)
+        # Drop optional files left by an older build (e.g. a parquet docstore
+        # written when pyarrow was installed) so they can't shadow the new index
+        for stale in subject_faiss_dir.iterdir():
+            if stale.is_file() and stale.name not in index_files + [METADATA_FILE]:
+                stale.unlink()
+        _METADATA_CACHE[subject_name] = metadata
+    finally:
+        # Empty after a successful save; holds the partial files otherwise
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+@contextmanager
+def _subject_build_lock(subject_name):
+    """Hold an exclusive lock file for a subject's vectorstore across processes.
+
+    uvicorn workers may initialize the same subject at once; the lock makes the
+    others wait and then load the finished build instead of rebuilding it.
+    """
+    if fcntl is None:
+        yield
+        return
+    Path(VECTORSTORE_ROOT).mkdir(parents=True, exist_ok=True)
+    lock_path = Path(VECTORSTORE_ROOT) / f"{subject_name}_faiss.lock"
+    with open(lock_path, "a") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
 
 def should_rebuild_vectorstore(subject_name):
     """Check if the vectorstore exists and if the source files have changed for a specific subject."""
@@ -90,25 +302,199 @@ def should_rebuild_vectorstore(subject_name):
         print(f"💡 Vectorstore index files missing for {subject_name}. Rebuilding.")
         return True
     
-    current_hash = get_folder_hash(subject_path)
     metadata = get_metadata(subject_name)
+
+    if metadata.get("index_config") != INDEX_CONFIG:
+        print(f"💡 Index settings changed for {subject_name}. Rebuilding vectorstore.")
+        return True
+
+    current_stats = get_folder_stats(subject_path)
+
+    # Unchanged mtime/size means unchanged files; skip hashing entirely
+    if metadata.get("file_stats") == current_stats:
+        return False
+
+    current_hash = get_folder_hash(subject_path)
     
     # Check if hash is missing or mismatched
     if metadata.get("file_hash") != current_hash:
         print(f"💡 File hash mismatch for {subject_name}. Rebuilding vectorstore.")
         return True
-    
+
+    # Files were touched but not modified; record the new stats for next time
+    metadata["file_stats"] = current_stats
+    write_metadata(subject_name, metadata)
     return False
 
 # ----------------------------
 # CORE RAG FUNCTIONS
 # ----------------------------
 
+def _open_pdf(pdf_path) -> PdfReader:
+    """Open a PDF for parsing from a single in-memory copy of the file."""
+    # One mmap-backed read instead of pypdf's many small seek+read calls
+    with open(pdf_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return PdfReader(io.BytesIO(mm))
+
+def _extract_pages(pdf_path, start, stop):
+    """Extract the text of pages [start, stop) of a PDF (runs in a worker process)."""
+    reader = _open_pdf(pdf_path)
+    return [(i, reader.pages[i].extract_text()) for i in range(start, stop)]
+
+def load_pdf_documents(pdf_path) -> List[Document]:
+    """Load a PDF as one Document per page, extracting pages in parallel."""
+    num_pages = len(_open_pdf(pdf_path).pages)
+    ranges = [
+        (start, min(start + PDF_PAGES_PER_WORKER, num_pages))
+        for start in range(0, num_pages, PDF_PAGES_PER_WORKER)
+    ]
+
+    if len(ranges) <= 1:
+        pages = _extract_pages(pdf_path, 0, num_pages)
+    else:
+        # pypdf is pure Python, so processes (not threads) are needed to use all cores
+        with ProcessPoolExecutor(max_workers=min(len(ranges), os.cpu_count() or 1)) as pool:
+            futures = [pool.submit(_extract_pages, pdf_path, start, stop) for start, stop in ranges]
+            pages = [page for future in futures for page in future.result()]
+
+    return [
+        Document(page_content=text, metadata={"source": pdf_path, "page": i})
+        for i, text in sorted(pages)
+    ]
+
+def _snap_to_boundary(text, offsets, start, end):
+    """Move a chunk end back to the nearest paragraph or sentence break in its second half."""
+    min_end = start + (end - start) // 2
+    for separator in ("\n\n", "\n", ". "):
+        for i in range(end, min_end, -1):
+            # Text of the chunk's last token plus the gap before the next token
+            if separator in text[offsets[i - 1][0]:offsets[i][0]]:
+                return i
+    return end
+
+def split_documents_by_tokens(documents: List[Document], tokenizer,
+                              chunk_tokens=CHUNK_TOKENS,
+                              overlap_tokens=CHUNK_OVERLAP_TOKENS) -> List[Document]:
+    """Split Documents by token count, tokenizing each document only once.
+
+    Chunk boundaries are taken from the token offset mapping, so no substring
+    is ever re-tokenized while searching for a split point.
+    """
+    chunks = []
+    for doc in documents:
+        text = doc.page_content
+        offsets = tokenizer(
+            text, return_offsets_mapping=True, add_special_tokens=False
+        )["offset_mapping"]
+        num_tokens = len(offsets)
+
+        start = 0
+        while start < num_tokens:
+            end = min(start + chunk_tokens, num_tokens)
+            if end < num_tokens:
+                end = _snap_to_boundary(text, offsets, start, end)
+
+            chunk = text[offsets[start][0]:offsets[end - 1][1]].strip()
+            if chunk:
+                chunks.append(Document(page_content=chunk, metadata=dict(doc.metadata)))
+            if end >= num_tokens:
+                break
+            start = max(end - overlap_tokens, start + 1)
+    return chunks
+
+def split_documents(documents: List[Document]) -> List[Document]:
+    """Split page Documents into overlapping chunks for RAG."""
+    if TOKEN_AWARE_SPLITTING:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL)
+        return split_documents_by_tokens(documents, tokenizer)
+
+    if RustTextSplitter is None:
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
+            length_function=len
+        )
+        return text_splitter.split_documents(documents)
+
+    # Built-in character counter keeps the whole split loop in Rust
+    splitter = RustTextSplitter(capacity=(CHUNK_MIN_SIZE, CHUNK_SIZE), overlap=CHUNK_OVERLAP)
+    return [
+        Document(page_content=chunk, metadata=dict(doc.metadata))
+        for doc in documents
+        for chunk in splitter.chunks(doc.page_content)
+    ]
+
+@functools.lru_cache(maxsize=1)
 def create_embeddings():
-    """Initialize the HuggingFace Embeddings model."""
-    return HuggingFaceEmbeddings(model_name="BAAI/bge-small-en-v1.5")
+    """Initialize the embeddings model once (ONNX Runtime if configured, else HuggingFace)."""
+    if EMBEDDINGS_ONNX_DIR:
+        if Path(EMBEDDINGS_ONNX_DIR).is_dir():
+            from onnx_embeddings import OnnxEmbeddings
+            return OnnxEmbeddings(EMBEDDINGS_ONNX_DIR, batch_size=EMBED_BATCH_SIZE)
+        print(f"⚠️ EMBEDDINGS_ONNX_DIR '{EMBEDDINGS_ONNX_DIR}' not found. Falling back to PyTorch.")
+
+    import torch
+    torch.set_num_threads(int(os.environ["OMP_NUM_THREADS"]))
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    embeddings = HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL,
+        model_kwargs={"device": device},
+        encode_kwargs={"batch_size": EMBED_BATCH_SIZE, "normalize_embeddings": True},
+        show_progress=False,
+    )
+    if device == "cuda":
+        # fp16 on GPU for encoding only; outputs are stored/compared as fp32
+        _sentence_transformer(embeddings).half()
+    if EMBEDDINGS_COMPILE:
+        optimize_embeddings(embeddings)
+    return embeddings
+
+def _sentence_transformer(embeddings):
+    """Return the SentenceTransformer inside a HuggingFaceEmbeddings instance."""
+    return getattr(embeddings, "_client", None) or getattr(embeddings, "client", None)
+
+def optimize_embeddings(embeddings):
+    """Swap in fused attention kernels and torch.compile the embedding model."""
+    import torch
+
+    transformer = _sentence_transformer(embeddings)[0]
+    try:
+        from optimum.bettertransformer import BetterTransformer
+        transformer.auto_model = BetterTransformer.transform(transformer.auto_model)
+    except Exception as e:
+        print(f"⚠️ BetterTransformer not applied: {e}")
+
+    if hasattr(torch, "compile"):
+        # Batch size and padded length vary per call, so compile for dynamic
+        # shapes; static graphs (and reduce-overhead's per-shape CUDA graphs)
+        # would recompile on the request path for every new shape
+        transformer.auto_model = torch.compile(transformer.auto_model, dynamic=True)
+
+    # Pay the compile cost now rather than on the first request: a second,
+    # differently shaped call triggers the dynamic-shape compile
+    embeddings.embed_query("warmup")
+    embeddings.embed_documents(["warmup " * 64, "warmup"])
+
+def quantize_index(index):
+    """Re-encode a flat FAISS index with fp16 scalar quantization."""
+    num_vectors = index.ntotal
+    vectors = index.reconstruct_n(0, num_vectors)
+
+    if num_vectors >= IVF_MIN_CHUNKS:
+        nlist = int(4 * math.sqrt(num_vectors))
+        description = f"IVF{nlist},{INDEX_CONFIG['quantizer']}"
+    else:
+        description = INDEX_CONFIG["quantizer"]
+
+    quantized = faiss.index_factory(index.d, description, index.metric_type)
+    quantized.train(vectors)
+    quantized.add(vectors)
+    if num_vectors >= IVF_MIN_CHUNKS:
+        faiss.extract_index_ivf(quantized).nprobe = IVF_NPROBE
+    return quantized, description
 
-def build_vectorstore(subject_name) -> Tuple[Any, Any]:
+def build_vectorstore(subject_name, embeddings=None) -> Tuple[Any, Any]:
     """Load PDFs for a subject, chunk, and build the FAISS vectorstore."""
     subject_folder = Path(CURRICULUM_ROOT) / subject_name
     vectorstore_path_str = str(Path(VECTORSTORE_ROOT) / f"{subject_name}_faiss")
@@ -126,8 +512,7 @@ def build_vectorstore(subject_name) -> Tuple[Any, Any]:
     
     for pdf_file in pdf_files:
         try:
-            loader = PyPDFLoader(pdf_file)
-            documents = loader.load()
+            documents = load_pdf_documents(pdf_file)
             all_documents.extend(documents)
             print(f"📄 Loaded {Path(pdf_file).name} ({len(documents)} pages)")
         except Exception as e:
@@ -138,28 +523,27 @@ def build_vectorstore(subject_name) -> Tuple[Any, Any]:
         return None, None
 
     # 2. Split documents into chunks
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-        length_function=len
-    )
-    text_chunks = text_splitter.split_documents(all_documents)
+    text_chunks = split_documents(all_documents)
     print(f"✂️ Split into {len(text_chunks)} chunks for RAG")
 
     # 3. Create embeddings and vectorstore
     try:
-        embeddings = create_embeddings()
-        vectorstore = FAISS.from_documents(text_chunks, embeddings)
+        if embeddings is None:
+            embeddings = create_embeddings()
+        vectorstore = FAISS.from_documents(
+            text_chunks, embeddings, distance_strategy=DISTANCE_STRATEGY
+        )
         print("✅ Embeddings created.")
 
-        # 4. Save
-        Path(vectorstore_path_str).mkdir(parents=True, exist_ok=True) 
-        vectorstore.save_local(vectorstore_path_str)
-        print(f"💾 Vectorstore saved to {vectorstore_path_str}")
-        
-        # Save metadata only if save_local succeeds
+        vectorstore.index, index_description = quantize_index(vectorstore.index)
+        print(f"🗜️ Index quantized ({index_description})")
+
+        # 4. Save index and metadata together
         files_hash = get_folder_hash(subject_folder)
-        metadata = save_metadata(subject_name, files_hash, len(all_documents), len(text_chunks))
+        file_stats = get_folder_stats(subject_folder)
+        metadata = build_metadata(files_hash, len(all_documents), len(text_chunks), file_stats)
+        save_vectorstore(subject_name, vectorstore, metadata)
+        print(f"💾 Vectorstore saved to {vectorstore_path_str}")
         print(f"📝 Metadata saved: {metadata['num_chunks']} chunks, built at {metadata['last_build']}")
 
     except Exception as e:
@@ -170,7 +554,32 @@ def build_vectorstore(subject_name) -> Tuple[Any, Any]:
     return vectorstore, embeddings
 
 
-def load_vectorstore(subject_name) -> Tuple[Any, Any]:
+def read_vectorstore(vectorstore_path, embeddings):
+    """Read a saved FAISS vectorstore, memory-mapping the index read-only."""
+    vectorstore_path = Path(vectorstore_path)
+    # The flat SQfp16 codes are only mapped (and shared across worker
+    # processes through the page cache) with IO_FLAG_MMAP_IFC; plain
+    # IO_FLAG_MMAP covers just IVF inverted lists
+    index = faiss.read_index(str(vectorstore_path / "index.faiss"), MMAP_READ_FLAGS)
+
+    # Prefer the parquet docstore: mmapped columns instead of unpickling every Document
+    parquet_path = vectorstore_path / DOCSTORE_FILE
+    if parquet_docstore is not None and parquet_path.exists():
+        docstore, index_to_docstore_id = parquet_docstore.ParquetDocstore.load(parquet_path)
+    else:
+        with open(vectorstore_path / "index.pkl", "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id,
+        distance_strategy=DISTANCE_STRATEGY
+    )
+
+
+def load_vectorstore(subject_name, embeddings=None) -> Tuple[Any, Any]:
     """Load existing vectorstore from disk for a specific subject"""
     vectorstore_path_str = str(Path(VECTORSTORE_ROOT) / f"{subject_name}_faiss")
     
@@ -180,15 +589,12 @@ def load_vectorstore(subject_name) -> Tuple[Any, Any]:
     
     if not (Path(vectorstore_path_str) / "index.faiss").exists():
         print(f"⚠️  Cached index file missing for {subject_name}. Forcing rebuild.")
-        return build_vectorstore(subject_name)
+        return build_vectorstore(subject_name, embeddings)
         
     try:
-        embeddings = create_embeddings()
-        vectorstore = FAISS.load_local(
-            vectorstore_path_str,
-            embeddings,
-            allow_dangerous_deserialization=True
-        )
+        if embeddings is None:
+            embeddings = create_embeddings()
+        vectorstore = read_vectorstore(vectorstore_path_str, embeddings)
 
         metadata = get_metadata(subject_name)
         if metadata:
@@ -198,21 +604,45 @@ def load_vectorstore(subject_name) -> Tuple[Any, Any]:
         print("✅ Vectorstore loaded successfully!")
     except Exception as e:
         print(f"❌ Error loading vectorstore for {subject_name}: {e}. Attempting rebuild.")
-        return build_vectorstore(subject_name)
+        return build_vectorstore(subject_name, embeddings)
 
     print("=" * 80 + "\n")
     return vectorstore, embeddings
 
 
-def initialize_vectorstore(subject_name, force_rebuild=False) -> Tuple[Any, Any]:
+def initialize_vectorstore(subject_name, force_rebuild=False, embeddings=None) -> Tuple[Any, Any]:
     """Initialize vectorstore with caching for a specific subject"""
+    # Shared by the load path, the build path and any load->build fallback
+    if embeddings is None:
+        embeddings = create_embeddings()
+
     if subject_name in GLOBAL_VECTORSTORES and not force_rebuild:
-        return GLOBAL_VECTORSTORES[subject_name], create_embeddings() # Return cached
+        return GLOBAL_VECTORSTORES[subject_name], embeddings # Return cached
+
+    with _subject_build_lock(subject_name):
+        # Another process may have rebuilt the subject while we waited
+        _METADATA_CACHE.pop(subject_name, None)
+        if force_rebuild or should_rebuild_vectorstore(subject_name):
+            vectorstore, embeddings = build_vectorstore(subject_name, embeddings)
+        else:
+            vectorstore, embeddings = load_vectorstore(subject_name, embeddings)
+
+    if vectorstore is not None:
+        GLOBAL_VECTORSTORES[subject_name] = vectorstore
+    return vectorstore, embeddings
 
-    if force_rebuild or should_rebuild_vectorstore(subject_name):
-        return build_vectorstore(subject_name)
-    else:
-        return load_vectorstore(subject_name)
+
+def get_vectorstore(subject_name, embeddings=None):
+    """Return the subject's vectorstore, loading it on first use (thread-safe)."""
+    vectorstore = GLOBAL_VECTORSTORES.get(subject_name)
+    if vectorstore is not None:
+        return vectorstore
+
+    with _VECTORSTORES_LOCK:
+        # Another thread may have finished loading while we waited
+        if subject_name not in GLOBAL_VECTORSTORES:
+            initialize_vectorstore(subject_name, embeddings=embeddings)
+        return GLOBAL_VECTORSTORES.get(subject_name)
 
 
 def get_available_subjects() -> list:
@@ -242,7 +672,4 @@ def initialize_all_vectorstores():
     print("ℹ️  Vectorstores will initialize on first request (lazy loading)")
     print("#" * 80 + "\n")
 
-    return subjects
-
-# Initialize on import (just discovers subjects, doesn't load vectorstores)
-AVAILABLE_SUBJECTS = initialize_all_vectorstores()
\ No newline at end of file
+    return subjects
\ No newline at end of file
@@ -1,22 +1,29 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional, Literal
 from contextlib import asynccontextmanager
 import json
 import os
 import asyncio
+import logging
 
 # Import your RAG system - CRITICAL: Make sure these imports work
 try:
-    from rag import generate_lesson, Pace, load_subject_components, RAG_COMPONENTS, initialize_hf_llm
-    from dataLoading import get_available_subjects, AVAILABLE_SUBJECTS
+    from rag import generate_lesson, stream_lesson, Pace, get_subject, RAG_COMPONENTS
+    from dataLoading import initialize_all_vectorstores
     print("✓ Successfully imported RAG and DataLoading modules")
 except ImportError as e:
     print(f"✗ IMPORT ERROR: {e}")
     raise
 
+logger = logging.getLogger(__name__)
+
+# Subjects discovered at startup (see lifespan)
+AVAILABLE_SUBJECTS: List[str] = []
+
+
 # Pydantic models
 class LessonRequest(BaseModel):
     subject: str = Field(..., min_length=1)
@@ -46,18 +53,11 @@ async def lifespan(app: FastAPI):
     print("=" * 80)
     print("🇸🇱 SSS AI Tutor API Starting...")
     print("=" * 80)
+    AVAILABLE_SUBJECTS[:] = await asyncio.to_thread(initialize_all_vectorstores)
     print(f"✓ {len(AVAILABLE_SUBJECTS)} subject(s) discovered: {', '.join(AVAILABLE_SUBJECTS)}")
-    print("ℹ️  Vectorstores load on first request (lazy loading)")
+    print("ℹ️  LLM and vectorstores load on first request (lazy loading)")
     print("=" * 80)
 
-    try:
-        initialize_hf_llm()
-        print("✓ LLM initialized successfully")
-    except Exception as e:
-        print(f"⚠️  LLM initialization failed: {e}")
-        import traceback
-        traceback.print_exc()
-
     yield
 
     print("=" * 80)
@@ -70,7 +70,8 @@ app = FastAPI(
     title="SSS AI Tutor API",
     description="AI-powered personalized lessons for SSS curriculum",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # CORS
@@ -113,66 +114,85 @@ async def get_status():
     )
 
 
-@app.post("/lesson", response_model=LessonResponse)
-async def create_lesson(request: LessonRequest):
-    """Generate a personalized lesson"""
-    
+async def ensure_subject_loaded(subject: str):
+    """Validate a subject and lazily load its RAG components (raises HTTPException)."""
     # Validate subject
-    if request.subject not in AVAILABLE_SUBJECTS:
+    if subject not in AVAILABLE_SUBJECTS:
         raise HTTPException(
             status_code=404,
-            detail=f"Subject '{request.subject}' not found. Available: {', '.join(AVAILABLE_SUBJECTS)}"
+            detail=f"Subject '{subject}' not found. Available: {', '.join(AVAILABLE_SUBJECTS)}"
         )
 
     # Lazy load subject if needed
-    if request.subject not in RAG_COMPONENTS:
-        print(f"⚡ Lazy loading subject: {request.subject}")
+    if subject not in RAG_COMPONENTS:
+        logger.info("Lazy loading subject: %s", subject)
         try:
-            # FIXED: Only pass subject_name, not LLM (it uses global LLM now)
-            success = await asyncio.to_thread(
-                load_subject_components, 
-                request.subject
-            )
-            if not success:
-                raise Exception(f"Failed to initialize {request.subject}")
+            await get_subject(subject)
         except Exception as e:
-            import traceback
-            print(f"❌ Error during lazy loading: {e}")
-            traceback.print_exc()
+            logger.exception("Error during lazy loading of %s", subject)
             raise HTTPException(
                 status_code=503,
-                detail=f"Could not initialize '{request.subject}': {str(e)}"
+                detail=f"Could not initialize '{subject}': {str(e)}"
             )
 
-    print(f"📝 Generating lesson: {request.subject} - {request.topic} ({request.sss_level}, {request.learning_pace})")
+
+@app.post("/lesson", response_model=LessonResponse)
+async def create_lesson(request: LessonRequest):
+    """Generate a personalized lesson"""
+    
+    await ensure_subject_loaded(request.subject)
+
+    logger.debug("Generating lesson: %s - %s (%s, %s)", request.subject, request.topic, request.sss_level, request.learning_pace)
 
     try:
-        # Generate lesson (blocking call in thread)
-        lesson_text = await asyncio.to_thread(
-            generate_lesson,
+        # Generate lesson (rag's exact/semantic caches skip repeat requests)
+        lesson_text = await generate_lesson(
             request.subject,
-            request.topic,
+            " ".join(request.topic.split()),
             request.sss_level,
             request.learning_pace
         )
         
-        # Return the actual lesson text
-        return LessonResponse(
-            subject=request.subject,
-            topic=request.topic,
-            sss_level=request.sss_level,
-            learning_pace=request.learning_pace,
-            lesson_notes=lesson_text if lesson_text else "Lesson generation completed. Check server logs.",
-            status="success"
-        )
+        # Return the actual lesson text (already valid, so skip response_model validation)
+        return ORJSONResponse(content={
+            "subject": request.subject,
+            "topic": request.topic,
+            "sss_level": request.sss_level,
+            "learning_pace": request.learning_pace,
+            "lesson_notes": lesson_text if lesson_text else "Lesson generation completed. Check server logs.",
+            "status": "success"
+        })
 
     except Exception as e:
-        print(f"❌ Error during lesson generation: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error during lesson generation")
         raise HTTPException(status_code=500, detail=f"Lesson generation failed: {str(e)}")
 
 
+@app.post("/lesson/stream")
+async def stream_lesson_endpoint(request: LessonRequest):
+    """Stream a personalized lesson as Server-Sent Events while it is generated"""
+    await ensure_subject_loaded(request.subject)
+
+    logger.debug("Streaming lesson: %s - %s (%s, %s)", request.subject, request.topic, request.sss_level, request.learning_pace)
+
+    async def events():
+        try:
+            async for token in stream_lesson(
+                request.subject,
+                " ".join(request.topic.split()),
+                request.sss_level,
+                request.learning_pace
+            ):
+                yield f"data: {json.dumps({'token': token})}\n\n"
+        except Exception as e:
+            logger.exception("Error during lesson streaming")
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+            return
+        yield "event: end\ndata: {}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
 @app.get("/topics")
 async def get_topics():
     """Get example topics for each subject"""
@@ -202,6 +222,8 @@ async def get_topics():
 if __name__ == "__main__":
     import uvicorn
 
+    logging.basicConfig(level=logging.INFO)
+
     print("\n" + "=" * 80)
     print("🚀 Starting SSS AI Tutor API")
     print("=" * 80)
@@ -210,9 +232,15 @@ if __name__ == "__main__":
     print("✅ Status: http://localhost:8000/status")
     print("=" * 80 + "\n")
 
+    # uvloop + httptools come with uvicorn[standard] ("auto" picks them when
+    # installed); a longer keep-alive lets clients reuse connections
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8002,
-        reload=False
+        reload=False,
+        workers=int(os.environ.get("WEB_CONCURRENCY", "1")),
+        loop="auto",
+        http="auto",
+        timeout_keep_alive=30
     )
\ No newline at end of file
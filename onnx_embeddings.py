@@ -0,0 +1,56 @@
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class OnnxEmbeddings(Embeddings):
+    """BGE embeddings served from an (int8-quantized) ONNX Runtime session.
+
+    Expects a directory produced by:
+        optimum-cli export onnx --model BAAI/bge-small-en-v1.5 --task feature-extraction bge_onnx/
+        optimum-cli onnxruntime quantize --avx512_vnni --onnx_model bge_onnx/ -o bge_int8/
+    """
+
+    def __init__(self, model_dir: str, batch_size: int = 32, max_length: int = 512):
+        # Optional dependencies: only needed when the ONNX backend is enabled
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_dir = Path(model_dir)
+        model_path = model_dir / "model_quantized.onnx"
+        if not model_path.exists():
+            model_path = model_dir / "model.onnx"
+
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+        self.session = ort.InferenceSession(str(model_path), providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        vectors: List[List[float]] = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            encoded = self.tokenizer(
+                batch,
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np",
+            )
+            feeds = {k: v.astype(np.int64) for k, v in encoded.items() if k in self.input_names}
+            last_hidden_state = self.session.run(None, feeds)[0]
+
+            # BGE uses the [CLS] token as the sentence embedding, L2-normalized
+            cls = last_hidden_state[:, 0]
+            cls = cls / np.linalg.norm(cls, axis=1, keepdims=True)
+            vectors.extend(cls.astype(np.float32).tolist())
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(list(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0]
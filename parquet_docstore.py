@@ -0,0 +1,48 @@
+from typing import Dict, List, Tuple, Union
+
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+
+
+class ParquetDocstore(Docstore):
+    """Read-only docstore backed by a memory-mapped parquet file.
+
+    Rows are stored in FAISS index order, so loading skips unpickling every
+    Document up front; a Document is only built when a search hits its row.
+    """
+
+    def __init__(self, table: pa.Table):
+        self._ids = table.column("id").to_pylist()
+        self._texts = table.column("text")
+        self._metadata = table.column("metadata")
+        self._row_by_id = {doc_id: row for row, doc_id in enumerate(self._ids)}
+
+    @classmethod
+    def load(cls, path) -> Tuple["ParquetDocstore", Dict[int, str]]:
+        """Open a parquet docstore and return it with its index-to-id mapping."""
+        docstore = cls(pq.read_table(str(path), memory_map=True))
+        return docstore, dict(enumerate(docstore._ids))
+
+    def search(self, search: str) -> Union[str, Document]:
+        row = self._row_by_id.get(search)
+        if row is None:
+            return f"ID {search} not found."
+        return Document(
+            page_content=self._texts[row].as_py(),
+            metadata=orjson.loads(self._metadata[row].as_py()),
+        )
+
+
+def write_docstore(path, docstore: Docstore, index_to_docstore_id: Dict[int, str]):
+    """Write a vectorstore's documents to parquet in FAISS index order."""
+    ids: List[str] = [index_to_docstore_id[i] for i in range(len(index_to_docstore_id))]
+    documents = [docstore.search(doc_id) for doc_id in ids]
+    table = pa.table({
+        "id": ids,
+        "text": [doc.page_content for doc in documents],
+        "metadata": [orjson.dumps(doc.metadata).decode() for doc in documents],
+    })
+    pq.write_table(table, str(path))
@@ -1,71 +1,192 @@
 import os
+import time
+import logging
+import functools
+import asyncio
+import threading
+from collections import OrderedDict
+from operator import attrgetter
 from dotenv import load_dotenv
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain 
-from dataLoading import initialize_vectorstore, get_available_subjects
+# dataLoading sets the OpenMP/MKL thread defaults, so it must be imported
+# before numpy/faiss start their thread pools
+from dataLoading import get_vectorstore, get_vectorstore_path, get_available_subjects, create_embeddings
+import faiss
+import numpy as np
+from retrieval import DenseRetriever
 from langchain_huggingface import HuggingFaceEndpoint, ChatHuggingFace
-from typing import Literal, Dict, Any
+from typing import Literal, Dict, Any, AsyncIterator, Optional, Tuple
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Define the valid pace options
 Pace = Literal["low", "moderate", "advance"]
 
-# Global store for active components
-LLM = None
+# Global store for active components (filled lazily by get_subject)
 RAG_COMPONENTS: Dict[str, Any] = {}
+_SUBJECT_LOCKS: Dict[str, asyncio.Lock] = {}
+
+# Semantic lesson cache: a topic counts as a hit if its embedding is this
+# similar to a cached topic; entries expire so curriculum updates show up.
+# Topics are free text, so the number of entries is capped as well
+SEMANTIC_CACHE_THRESHOLD = 0.92
+SEMANTIC_CACHE_TTL = 7 * 24 * 60 * 60
+SEMANTIC_CACHE_SIZE = 10_000
+_SEMANTIC_CACHE = None
+
+# Exact-match lesson cache in front of the semantic cache, keyed by
+# (subject, level, pace, normalized topic); hits skip the embedding call
+EXACT_CACHE_SIZE = 10_000
+_EXACT_CACHE: "OrderedDict[Tuple[str, str, str, str], Tuple[str, float]]" = OrderedDict()
+
+# Retrieval context per (subject, level, topic); pace only affects generation,
+# so the pace variants of one lesson share a single retrieval
+RETRIEVAL_CACHE_SIZE = 512
+_RETRIEVAL_CACHE: "OrderedDict[Tuple[str, str, str], str]" = OrderedDict()
+_RETRIEVAL_INFLIGHT: Dict[Tuple[str, str, str], "asyncio.Future[str]"] = {}
+
+# Retrieval: up to RETRIEVAL_K chunks, dropping those below the similarity floor
+RETRIEVAL_K = 3
+RETRIEVAL_SCORE_THRESHOLD = 0.55
+
+# LLM and the prompt-token budget for retrieved curriculum context
+LLM_REPO_ID = "mistralai/Mistral-7B-Instruct-v0.3"
+CONTEXT_TOKEN_BUDGET = 1500
+CHARS_PER_TOKEN = 4  # estimate used if the LLM tokenizer can't be loaded
+
+# Generation length per pace; the prompt asks the model to close the lesson
+# with LESSON_END_MARKER, which is also a stop sequence. It is a sentinel that
+# can't occur in lesson text (a heading like "## END" would match "## ENDING")
+_PACE_TOKENS = {"low": 800, "moderate": 500, "advance": 400}
+LESSON_END_MARKER = "<<END_OF_LESSON>>"
+_STOP_SEQUENCES = [LESSON_END_MARKER]
+
+# Concurrent requests allowed against the HuggingFace endpoint
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+_LLM_SEMAPHORE: Optional[asyncio.Semaphore] = None
+
+_get_content = attrgetter("page_content")
+
+
+class SemanticCache:
+    """
+    Cache of generated lessons, matched by topic similarity.
 
-def initialize_hf_llm():
-    """Initializes the LLM from HuggingFace."""
-    global LLM
-    
-    if LLM is not None:
-        print("DEBUG: LLM already initialized, reusing existing instance.")
-        return LLM
-    
-    token = os.getenv("HUGGINGFACEHUB_API_TOKEN")
-    if not token:
-        raise EnvironmentError(
-            "HUGGINGFACEHUB_API_TOKEN is not set. Please get a token and set it in your .env file."
-        )
-        
-    print("DEBUG: Initializing HuggingFace LLM...")
-    try:
-        base_llm = HuggingFaceEndpoint(
-            repo_id="mistralai/Mistral-7B-Instruct-v0.3",
-            huggingfacehub_api_token=token,
-            temperature=0.3,
-            max_new_tokens=800,
-        )
+    Lessons are bucketed by exact (subject, level, pace), since those change what
+    a lesson must contain; within a bucket, topics are matched by cosine
+    similarity in a small FAISS inner-product index.
 
-        LLM = ChatHuggingFace(llm=base_llm)
-        print("DEBUG: HuggingFace LLM initialized successfully.")
-        print(f"DEBUG: LLM object type: {type(LLM)}")
-        print(f"DEBUG: LLM is None: {LLM is None}")
-        return LLM
-    except Exception as e:
-        print(f"ERROR: Failed to initialize LLM: {e}")
-        raise
+    Once max_entries lessons are cached, expired entries are dropped, then the
+    oldest ones, and the affected bucket indexes are rebuilt.
+    """
 
+    def __init__(self, embeddings, threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 ttl: float = SEMANTIC_CACHE_TTL, max_entries: int = SEMANTIC_CACHE_SIZE):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._buckets: Dict[Tuple[str, str, str], Tuple[Any, list]] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def embed(self, topic: str) -> np.ndarray:
+        """Embed a topic as a normalized (1, d) float32 query vector."""
+        vector = np.asarray([self.embeddings.embed_query(topic.lower().strip())], dtype=np.float32)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def _nearest(self, bucket, vector) -> Optional[int]:
+        entry = self._buckets.get(bucket)
+        if entry is None:
+            return None
+        index, _ = entry
+        scores, ids = index.search(vector, 1)
+        if ids[0][0] < 0 or scores[0][0] < self.threshold:
+            return None
+        return int(ids[0][0])
+
+    def lookup(self, bucket, vector) -> Optional[Tuple[str, float]]:
+        """Return a fresh (lesson, created_at) cached for a similar topic, if any."""
+        with self._lock:
+            position = self._nearest(bucket, vector)
+            if position is None:
+                return None
+            lesson_text, created_at = self._buckets[bucket][1][position]
+        if time.time() - created_at > self.ttl:
+            return None
+        return lesson_text, created_at
+
+    def add(self, bucket, vector, lesson_text: str):
+        """Cache a lesson, replacing the entry for an equivalent topic if present."""
+        with self._lock:
+            position = self._nearest(bucket, vector)
+            if position is not None:
+                self._buckets[bucket][1][position] = (lesson_text, time.time())
+                return
+            if self._size >= self.max_entries:
+                self._prune()
+            if bucket not in self._buckets:
+                self._buckets[bucket] = (faiss.IndexFlatIP(vector.shape[1]), [])
+            index, lessons = self._buckets[bucket]
+            index.add(vector)
+            lessons.append((lesson_text, time.time()))
+            self._size += 1
+
+    def _prune(self):
+        """Drop expired entries, then the oldest until a quarter of the space is free."""
+        cutoff = time.time() - self.ttl
+        created = sorted(c for _, lessons in self._buckets.values() for _, c in lessons if c > cutoff)
+        excess = len(created) - self.max_entries * 3 // 4
+        if excess > 0:
+            cutoff = created[excess - 1]
+
+        for bucket, (index, lessons) in list(self._buckets.items()):
+            keep = [i for i, (_, created_at) in enumerate(lessons) if created_at > cutoff]
+            if len(keep) == len(lessons):
+                continue
+            if not keep:
+                del self._buckets[bucket]
+                continue
+            # IndexFlatIP can't remove rows in place cheaply; rebuild from the kept vectors
+            rebuilt = faiss.IndexFlatIP(index.d)
+            rebuilt.add(index.reconstruct_n(0, index.ntotal)[keep])
+            self._buckets[bucket] = (rebuilt, [lessons[i] for i in keep])
+        self._size = sum(len(lessons) for _, lessons in self._buckets.values())
 
-def create_rag_components(subject_name: str, vectorstore, llm):
-    """
-    Creates the necessary RAG components (retriever and LLM chain) for a specific subject.
-    """
-    print(f"DEBUG: create_rag_components called for {subject_name}")
-    print(f"DEBUG: vectorstore is None: {vectorstore is None}")
-    print(f"DEBUG: llm is None: {llm is None}")
-    
-    if vectorstore is None:
-        print(f"ERROR: Vectorstore is None for {subject_name}")
+
+def _exact_cache_get(key) -> Optional[str]:
+    """Return a fresh lesson for an exact (subject, level, pace, topic) key, if any."""
+    entry = _EXACT_CACHE.get(key)
+    if entry is None:
         return None
-    
-    if llm is None:
-        print(f"ERROR: LLM is None for {subject_name}")
+    lesson_text, created_at = entry
+    if time.time() - created_at > SEMANTIC_CACHE_TTL:
+        del _EXACT_CACHE[key]
         return None
+    _EXACT_CACHE.move_to_end(key)
+    return lesson_text
 
-    try:
-        prompt_template = """
+
+def _exact_cache_put(key, lesson_text: str, created_at: Optional[float] = None):
+    _EXACT_CACHE[key] = (lesson_text, time.time() if created_at is None else created_at)
+    _EXACT_CACHE.move_to_end(key)
+    if len(_EXACT_CACHE) > EXACT_CACHE_SIZE:
+        _EXACT_CACHE.popitem(last=False)
+
+
+def get_semantic_cache() -> SemanticCache:
+    """Return the process-wide semantic cache (shares the vectorstore embedding model)."""
+    global _SEMANTIC_CACHE
+    if _SEMANTIC_CACHE is None:
+        _SEMANTIC_CACHE = SemanticCache(create_embeddings())
+    return _SEMANTIC_CACHE
+
+
+# Lesson prompt, filled with str.format (no PromptTemplate/LLMChain machinery
+# on the request path). Slots: context, topic, level, pace, subject_name.
+_PROMPT = """
 You are an AI tutor specializing in {subject_name} for a student in Sierra Leone's Senior Secondary School (SSS).
 Your task is to generate a comprehensive, personalized lesson on a specific topic based on the provided curriculum context.
 
@@ -94,6 +215,7 @@ User Request Details:
     - Include at least **three Practice Exercises** that are written in the **exact format of WAEC Multiple Choice Questions (Objective Type)**.
     - Each question must have four options (A, B, C, D).
     - **DO NOT** provide the answers to the Practice Exercises in the lesson.
+5. **Ending:** After the Practice Exercises, end the lesson with a final line containing only `<<END_OF_LESSON>>`.
 
 **PACE ADJUSTMENT:**
 - If **'low' (Beginner)**: Focus on foundational skills. Solved examples should be highly detailed, multi-step, and focus on simple WAEC questions.
@@ -102,100 +224,280 @@ User Request Details:
 
 Generate the complete, tailored lesson notes now.
 """
-        
-        CUSTOM_PROMPT = PromptTemplate(
-            template=prompt_template, 
-            input_variables=["context", "topic", "level", "pace", "subject_name"]
+
+
+def initialize_hf_llm():
+    """Initializes the LLM from HuggingFace."""
+    token = os.getenv("HUGGINGFACEHUB_API_TOKEN")
+    if not token:
+        raise EnvironmentError(
+            "HUGGINGFACEHUB_API_TOKEN is not set. Please get a token and set it in your .env file."
         )
         
-        print(f"DEBUG: Creating LLMChain for {subject_name}...")
-        llm_chain = LLMChain(prompt=CUSTOM_PROMPT, llm=llm)
-        print(f"DEBUG: LLMChain created successfully for {subject_name}")
-        
-        retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
-        print(f"DEBUG: Retriever created successfully for {subject_name}")
+    logger.debug("Initializing HuggingFace LLM...")
+    try:
+        base_llm = HuggingFaceEndpoint(
+            repo_id=LLM_REPO_ID,
+            huggingfacehub_api_token=token,
+            temperature=0.3,
+            max_new_tokens=800,
+        )
+
+        llm = ChatHuggingFace(llm=base_llm)
+        logger.debug("HuggingFace LLM initialized successfully (%s).", type(llm).__name__)
+        return llm
+    except Exception as e:
+        logger.error("Failed to initialize LLM: %s", e)
+        raise
+
+
+@functools.cache
+def get_llm_tokenizer():
+    """Return the LLM's tokenizer for prompt budgeting, or None if it can't be loaded."""
+    try:
+        from transformers import AutoTokenizer
+        return AutoTokenizer.from_pretrained(LLM_REPO_ID, token=os.getenv("HUGGINGFACEHUB_API_TOKEN"))
+    except Exception as e:
+        logger.warning("Could not load tokenizer for %s (%s). Estimating tokens from characters.", LLM_REPO_ID, e)
+        return None
+
+
+@functools.cache
+def get_llm():
+    """Return the shared LLM, initializing it on first use (failures are not cached)."""
+    return initialize_hf_llm()
+
+
+@functools.lru_cache(maxsize=4096)
+def _encode_chunk(text: str) -> Tuple[int, ...]:
+    """Token ids of a retrieved chunk; the same chunks recur across many topics."""
+    return tuple(get_llm_tokenizer().encode(text, add_special_tokens=False))
+
+
+def _bind_pace(llm, pace: Pace):
+    """
+    Bind the pace's token budget and the end-of-lesson stop sequence.
+
+    ChatHuggingFace sends these to the endpoint's chat-completion API, which
+    takes `max_tokens` (HuggingFaceEndpoint's `max_new_tokens` stays the default).
+    """
+    return llm.bind(max_tokens=_PACE_TOKENS.get(pace, 800), stop=_STOP_SEQUENCES)
+
+
+def _strip_end_marker(lesson_text: str) -> str:
+    """Drop the end marker (and anything after it) if the endpoint echoed it."""
+    return lesson_text.split(LESSON_END_MARKER, 1)[0].rstrip()
+
+
+def create_rag_components(subject_name: str, vectorstore, llm):
+    """
+    Creates the necessary RAG components (retriever and LLM) for a specific subject.
+    """
+    logger.debug("create_rag_components called for %s", subject_name)
+    
+    if vectorstore is None:
+        logger.error("Vectorstore is None for %s", subject_name)
+        return None
+    
+    if llm is None:
+        logger.error("LLM is None for %s", subject_name)
+        return None
+
+    try:
+        retriever = DenseRetriever.from_vectorstore(
+            vectorstore,
+            directory=get_vectorstore_path(subject_name),
+            k=RETRIEVAL_K,
+            score_threshold=RETRIEVAL_SCORE_THRESHOLD
+        )
+        logger.debug("Retriever created successfully for %s", subject_name)
 
         components = {
             "retriever": retriever,
-            "llm_chain": llm_chain
+            "llm": llm
         }
         
-        print(f"DEBUG: All components created successfully for {subject_name}")
+        logger.debug("All components created successfully for %s", subject_name)
         return components
         
-    except Exception as e:
-        print(f"ERROR: Exception in create_rag_components for {subject_name}: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("Exception in create_rag_components for %s", subject_name)
         return None
 
 
 def load_subject_components(subject_name: str):
     """Initialize or load vectorstore and RAG components for a given subject."""
-    global RAG_COMPONENTS, LLM
-    
-    print(f"DEBUG: load_subject_components called for {subject_name}")
+    logger.debug("load_subject_components called for %s", subject_name)
     
     # Ensure LLM is initialized
-    if LLM is None:
-        print("DEBUG: LLM is None, initializing...")
-        try:
-            initialize_hf_llm()
-        except Exception as e:
-            print(f"ERROR: Failed to initialize LLM: {e}")
-            return False
-    
-    print(f"DEBUG: LLM status: {'READY' if LLM is not None else 'NOT READY'}")
+    try:
+        llm = get_llm()
+    except Exception as e:
+        logger.error("Failed to initialize LLM: %s", e)
+        return False
     
     # Initialize Vectorstore
-    print(f"DEBUG: Attempting to initialize vectorstore for {subject_name}...")
+    logger.debug("Attempting to initialize vectorstore for %s...", subject_name)
     try:
-        vectorstore, _ = initialize_vectorstore(subject_name)
-        print(f"DEBUG: Vectorstore initialization result for {subject_name}: {'SUCCESS' if vectorstore else 'FAILURE'}")
-    except Exception as e:
-        print(f"ERROR: Exception during vectorstore initialization: {e}")
+        # One embedding model is shared by every subject's vectorstore
+        vectorstore = get_vectorstore(subject_name, embeddings=create_embeddings())
+        logger.debug("Vectorstore initialization result for %s: %s", subject_name, "SUCCESS" if vectorstore else "FAILURE")
+    except Exception:
+        logger.exception("Exception during vectorstore initialization for %s", subject_name)
         return False
 
     if vectorstore:
         # Create RAG components
-        components = create_rag_components(subject_name, vectorstore, LLM)
+        components = create_rag_components(subject_name, vectorstore, llm)
         if components:
             RAG_COMPONENTS[subject_name] = components
-            print(f"DEBUG: RAG Chain initialized status for {subject_name}: READY")
+            logger.info("RAG components for %s: READY", subject_name)
             return True
         else:
-            print(f"ERROR: create_rag_components returned None for {subject_name}")
+            logger.error("create_rag_components returned None for %s", subject_name)
     else:
-        print(f"ERROR: Vectorstore is None for {subject_name}")
+        logger.error("Vectorstore is None for %s", subject_name)
         
-    print(f"DEBUG: RAG Chain initialized status for {subject_name}: FAILED")
+    logger.error("RAG components for %s: FAILED", subject_name)
     return False
 
 
-def generate_lesson(subject_name: str, topic: str, level: str, pace: Pace):
+async def get_subject(subject_name: str) -> Dict[str, Any]:
     """
-    Generates a personalized lesson by manually orchestrating retrieval and generation.
+    Return a subject's RAG components, loading them (and the LLM) on first use.
+
+    A per-subject lock makes concurrent first requests share one cold load.
+    Raises RuntimeError if the subject cannot be loaded.
+    """
+    components = RAG_COMPONENTS.get(subject_name)
+    if components is not None:
+        return components
+
+    lock = _SUBJECT_LOCKS.setdefault(subject_name, asyncio.Lock())
+    async with lock:
+        if subject_name not in RAG_COMPONENTS:
+            if not await asyncio.to_thread(load_subject_components, subject_name):
+                raise RuntimeError(f"Failed to initialize {subject_name}")
+        return RAG_COMPONENTS[subject_name]
+
+
+async def _retrieve_context(retriever, subject_name: str, topic: str, level: str) -> str:
+    """Fetch curriculum chunks for a topic and join them into prompt context."""
+    # The vectorstore is already subject-scoped, so the query only needs the
+    # level and topic (`level` is e.g. "SSS 2")
+    retrieval_query = f"{level}: {topic}"
+    source_documents = await retriever.aretrieve(retrieval_query)
+    return await asyncio.to_thread(_select_context, source_documents)
+
+
+def _select_context(source_documents, budget: int = CONTEXT_TOKEN_BUDGET) -> str:
+    """
+    Pack retrieved chunks (most relevant first) into at most `budget` prompt tokens.
+
+    Prefill cost and KV-cache size grow with input tokens, so low-relevance tail
+    chunks are truncated or dropped instead of always sending all k chunks.
+    """
+    tokenizer = get_llm_tokenizer()
+    selected = []
+    remaining = budget
+    for text in map(_get_content, source_documents):
+        if tokenizer is not None:
+            ids = _encode_chunk(text)
+            if len(ids) > remaining:
+                text = tokenizer.decode(list(ids[:remaining]))
+            used = min(len(ids), remaining)
+        else:
+            max_chars = remaining * CHARS_PER_TOKEN
+            text = text[:max_chars]
+            used = -(-len(text) // CHARS_PER_TOKEN)
+
+        selected.append(text)
+        remaining -= used
+        if remaining <= 0:
+            break
+    return "\n---\n".join(selected)
+
+
+async def _get_context(retriever, subject_name: str, topic: str, level: str) -> str:
+    """Return retrieval context from the LRU cache, retrieving at most once per key."""
+    key = (subject_name, level, topic)
+    if key in _RETRIEVAL_CACHE:
+        _RETRIEVAL_CACHE.move_to_end(key)
+        return _RETRIEVAL_CACHE[key]
+
+    # Concurrent requests for the same key wait on the first one's retrieval
+    inflight = _RETRIEVAL_INFLIGHT.get(key)
+    if inflight is not None:
+        return await asyncio.shield(inflight)
+
+    task = asyncio.ensure_future(_retrieve_context(retriever, subject_name, topic, level))
+    _RETRIEVAL_INFLIGHT[key] = task
+    try:
+        context_text = await asyncio.shield(task)
+    finally:
+        _RETRIEVAL_INFLIGHT.pop(key, None)
+
+    _RETRIEVAL_CACHE[key] = context_text
+    if len(_RETRIEVAL_CACHE) > RETRIEVAL_CACHE_SIZE:
+        _RETRIEVAL_CACHE.popitem(last=False)
+    return context_text
+
+
+def _show_lesson(lesson_text: str, subject_name: str, level: str, pace: Pace):
+    print("\n" + "=" * 80)
+    print(f"✨ PERSONALIZED LESSON GENERATED ({subject_name} - {level}, {pace.upper()}) ✨")
+    print("=" * 80)
+    print(lesson_text) 
+
+
+def _get_llm_semaphore() -> asyncio.Semaphore:
+    """Semaphore capping concurrent LLM calls to the endpoint's rate limit."""
+    global _LLM_SEMAPHORE
+    if _LLM_SEMAPHORE is None:
+        _LLM_SEMAPHORE = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _LLM_SEMAPHORE
+
+
+async def _prepare_lesson(subject_name: str, topic: str, level: str, pace: Pace):
+    """
+    Resolve one lesson request up to the LLM call.
+
+    Returns ("done", lesson_text_or_None) when no generation is needed (cache hit
+    or error), otherwise ("generate", (llm, prompt_text, input_data, cache_key)).
     """
     components = RAG_COMPONENTS.get(subject_name)
 
     if components is None:
-        print(f"\n❌ RAG system not initialized for {subject_name}. Cannot generate lesson.")
-        return None
+        logger.error("RAG system not initialized for %s. Cannot generate lesson.", subject_name)
+        return "done", None
+
+    logger.debug("Generating lesson for Subject: %s | Topic: %s | Level: %s | Pace: %s", subject_name, topic, level, pace)
 
-    print(f"\n⚙️ Generating lesson for Subject: {subject_name} | Topic: {topic} | Level: {level} | Pace: {pace}...")
-    
     retriever = components["retriever"]
-    llm_chain = components["llm_chain"]
-    
+    llm = components["llm"]
+
+    # 0a. Exact-match cache lookup (no embedding needed)
+    cache_bucket = (subject_name, level, pace)
+    exact_key = cache_bucket + (topic.lower().strip(),)
+    cached_lesson = _exact_cache_get(exact_key)
+    if cached_lesson is not None:
+        logger.debug("Exact cache hit, returning cached lesson.")
+        return "done", cached_lesson
+
     try:
-        # 1. Retrieval Step
-        retrieval_query = f"SSS {level} {subject_name} syllabus content for the topic: {topic}"
-        source_documents = retriever.get_relevant_documents(retrieval_query)
-        
-        # 2. Context Formatting
-        context_text = "\n---\n".join([doc.page_content for doc in source_documents])
+        # 0b. Semantic cache lookup (skips retrieval and generation on a hit)
+        cache = get_semantic_cache()
+        topic_vector = await asyncio.to_thread(cache.embed, topic)
+        cached = cache.lookup(cache_bucket, topic_vector)
+        if cached is not None:
+            logger.debug("Semantic cache hit, returning cached lesson.")
+            # Promote with the original timestamp so the TTL still applies
+            _exact_cache_put(exact_key, *cached)
+            return "done", cached[0]
+
+        # 1. Retrieval Step + 2. Context Formatting
+        context_text = await _get_context(retriever, subject_name, topic, level)
 
-        # 3. Generation Step
         input_data = {
             "context": context_text,
             "topic": topic,
@@ -203,24 +505,85 @@ def generate_lesson(subject_name: str, topic: str, level: str, pace: Pace):
             "pace": pace,
             "subject_name": subject_name
         }
-        
-        result = llm_chain.invoke(input_data)
-        lesson_text = result['text']
-
-        # Display Results
-        print("\n" + "=" * 80)
-        print(f"✨ PERSONALIZED LESSON GENERATED ({subject_name} - {level}, {pace.upper()}) ✨")
-        print("=" * 80)
-        print(lesson_text) 
-        
-        return lesson_text
+        prompt_text = _PROMPT.format(**input_data)
+        return "generate", (llm, prompt_text, input_data, (exact_key, cache_bucket, topic_vector))
 
-    except Exception as e:
-        print(f"\n❌ Error during lesson generation: {str(e)}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("Error during lesson preparation")
+        return "done", None
+
+
+async def generate_lesson(subject_name: str, topic: str, level: str, pace: Pace) -> Optional[str]:
+    """
+    Generates a personalized lesson by manually orchestrating retrieval and generation.
+
+    Retrieval and the LLM round-trip are awaited, so concurrent lessons interleave
+    on one event loop instead of each blocking a thread. Returns None on failure.
+    """
+    state, value = await _prepare_lesson(subject_name, topic, level, pace)
+    if state == "done":
+        return value
+
+    llm, prompt_text, _, (exact_key, cache_bucket, topic_vector) = value
+
+    try:
+        # 3. Generation Step
+        async with _get_llm_semaphore():
+            output = await _bind_pace(llm, pace).ainvoke(prompt_text)
+    except Exception:
+        logger.exception("Error during lesson generation")
         return None
 
+    lesson_text = _strip_end_marker(output.content)
+    if not lesson_text:
+        logger.error("LLM returned an empty lesson; not caching it.")
+        return None
+    _exact_cache_put(exact_key, lesson_text)
+    get_semantic_cache().add(cache_bucket, topic_vector, lesson_text)
+    return lesson_text
+
+
+async def stream_lesson(subject_name: str, topic: str, level: str, pace: Pace) -> AsyncIterator[str]:
+    """
+    Yield a lesson's text as the LLM streams it, so the first words arrive after
+    prefill rather than after the whole lesson. Cache hits are yielded in one piece.
+    """
+    state, value = await _prepare_lesson(subject_name, topic, level, pace)
+    if state == "done":
+        if value is not None:
+            yield value
+        return
+
+    llm, prompt_text, _, (exact_key, cache_bucket, topic_vector) = value
+
+    parts = []
+    pending = ""
+    async with _get_llm_semaphore():
+        async for chunk in _bind_pace(llm, pace).astream(prompt_text):
+            if not chunk.content:
+                continue
+            pending += chunk.content
+            end = pending.find(LESSON_END_MARKER)
+            if end != -1:
+                pending = pending[:end]
+                break
+            # Hold back a tail that could be the start of a split end marker
+            safe = len(pending) - (len(LESSON_END_MARKER) - 1)
+            if safe > 0:
+                parts.append(pending[:safe])
+                yield pending[:safe]
+                pending = pending[safe:]
+    if pending.strip():
+        parts.append(pending)
+        yield pending
+
+    lesson_text = "".join(parts).rstrip()
+    if not lesson_text:
+        logger.error("LLM streamed an empty lesson; not caching it.")
+        return
+    _exact_cache_put(exact_key, lesson_text)
+    get_semantic_cache().add(cache_bucket, topic_vector, lesson_text)
+
 
 def show_welcome_message(available_subjects: list):
     """Display welcome message and instructions"""
@@ -234,22 +597,23 @@ def show_welcome_message(available_subjects: list):
     print("=" * 80)
 
 
-if __name__ == "__main__":
-    
-    # 0. Initialize LLM once
-    try:
-        initialize_hf_llm()
-    except Exception as e:
-        print(f"🔴 System initialization failed: {e}")
-        exit()
+def main():
+    """
+    Interactive CLI; a subject's components load while the user types the rest.
 
+    input() stays on the main thread so Ctrl-C interrupts it immediately; the
+    async pipeline runs on an event loop in a daemon thread.
+    """
     # 1. Discover available subjects
     available_subjects = get_available_subjects()
     if not available_subjects:
         print(f"🔴 ERROR: No curriculum folders found. Please check the setup.")
-        exit()
+        return
 
     show_welcome_message(available_subjects)
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
     
     # 2. Main interactive loop
     while True:
@@ -264,11 +628,8 @@ if __name__ == "__main__":
                 print(f"⚠️ Invalid subject. Please choose from: {', '.join(available_subjects)}")
                 continue
 
-            # Load components if needed
-            if subject not in RAG_COMPONENTS:
-                if not load_subject_components(subject):
-                    print(f"🔴 Could not load or build components for {subject}. Please fix the errors above.")
-                    continue
+            # Start loading components now; awaited once the lesson details are in
+            warmup = asyncio.run_coroutine_threadsafe(get_subject(subject), loop)
             
             # Get lesson details
             topic = input("📖 Enter Lesson Topic: ").strip()
@@ -285,11 +646,24 @@ if __name__ == "__main__":
             if pace not in ["low", "moderate", "advance"]:
                 print("⚠️ Pace must be 'low', 'moderate', or 'advance'.")
                 continue
-                
-            # Generate the lesson
-            generate_lesson(subject, topic, f"SSS {level}", pace)
 
-        except KeyboardInterrupt:
+            # Load components if needed
+            try:
+                warmup.result()
+            except Exception:
+                print(f"🔴 Could not load or build components for {subject}. Please fix the errors above.")
+                continue
+                
+            # Generate and display the lesson
+            lesson_text = asyncio.run_coroutine_threadsafe(
+                generate_lesson(subject, topic, f"SSS {level}", pace), loop
+            ).result()
+            if lesson_text is None:
+                print("❌ Lesson generation failed. See the log above for details.")
+            else:
+                _show_lesson(lesson_text, subject, f"SSS {level}", pace)
+
+        except (KeyboardInterrupt, EOFError):
             print("\n👋 Goodbye!")
             break
         except Exception as e:
@@ -298,4 +672,12 @@ if __name__ == "__main__":
             traceback.print_exc()
             break
 
-    print("\n👋 Thank you for using the Personalized Tutor. Goodbye!")
\ No newline at end of file
+    print("\n👋 Thank you for using the Personalized Tutor. Goodbye!")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n👋 Goodbye!")
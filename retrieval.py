@@ -0,0 +1,117 @@
+import asyncio
+from pathlib import Path
+from typing import List, Tuple
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+
+
+# Candidates taken from the int8 index before exact fp32 re-ranking
+RERANK_CANDIDATES = 20
+
+# Retrieval arrays saved next to a vectorstore's index.faiss
+MATRIX_FILE = "embeddings.npy"
+INT8_INDEX_FILE = "index_int8.faiss"
+
+# Read-only mmap flags for saved indexes. IO_FLAG_MMAP only maps IVF inverted
+# lists; flat/scalar-quantizer codes are mapped only with IO_FLAG_MMAP_IFC
+# (newer faiss). Without it, each process reads its own copy of the codes.
+MMAP_READ_FLAGS = (
+    faiss.IO_FLAG_MMAP | getattr(faiss, "IO_FLAG_MMAP_IFC", 0) | faiss.IO_FLAG_READ_ONLY
+)
+
+
+def build_retrieval_arrays(vectorstore) -> Tuple[np.ndarray, "faiss.Index"]:
+    """Decode a vectorstore's index into a normalized fp32 matrix plus an int8 copy."""
+    index = vectorstore.index
+    try:
+        matrix = index.reconstruct_n(0, index.ntotal)
+    except RuntimeError:
+        # IVF indexes can only reconstruct once they have a direct map
+        faiss.extract_index_ivf(index).make_direct_map()
+        matrix = index.reconstruct_n(0, index.ntotal)
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    faiss.normalize_L2(matrix)
+
+    int8_index = faiss.IndexScalarQuantizer(
+        matrix.shape[1], faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+    )
+    int8_index.train(matrix)
+    int8_index.add(matrix)
+    return matrix, int8_index
+
+
+def save_retrieval_files(arrays, directory):
+    """Write build_retrieval_arrays() output so workers can mmap it."""
+    matrix, int8_index = arrays
+    np.save(Path(directory) / MATRIX_FILE, matrix)
+    faiss.write_index(int8_index, str(Path(directory) / INT8_INDEX_FILE))
+
+
+class DenseRetriever:
+    """
+    Top-k retrieval over one contiguous (N, d) float32 matrix of chunk embeddings.
+
+    Rows are L2-normalized. Candidates come from an int8 scalar-quantized copy
+    (a quarter of the bytes to scan per query) and are re-ranked with the exact
+    fp32 rows; Documents are only fetched for the winning rows.
+
+    Up to k chunks are returned, but chunks scoring below score_threshold are
+    dropped (the best chunk is always kept) so weak matches don't pad the prompt.
+    """
+
+    def __init__(self, embeddings, matrix: np.ndarray, index, docstore, doc_ids: List[str],
+                 k: int = 3, score_threshold: float = 0.0):
+        self.embeddings = embeddings
+        self.matrix = matrix
+        self.index = index
+        self.docstore = docstore
+        self.doc_ids = doc_ids
+        self.k = k
+        self.score_threshold = score_threshold
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore, directory=None, k: int = 3,
+                         score_threshold: float = 0.0) -> "DenseRetriever":
+        """
+        Build a retriever for a LangChain FAISS vectorstore.
+
+        If `directory` holds the files written by save_retrieval_files, they are
+        memory-mapped read-only, so worker processes share them through the page
+        cache (the int8 index only where faiss has IO_FLAG_MMAP_IFC); otherwise
+        they are computed in memory.
+        """
+        directory = Path(directory) if directory is not None else None
+        if directory is not None and (directory / MATRIX_FILE).exists() and (directory / INT8_INDEX_FILE).exists():
+            matrix = np.load(directory / MATRIX_FILE, mmap_mode="r")
+            index = faiss.read_index(str(directory / INT8_INDEX_FILE), MMAP_READ_FLAGS)
+        else:
+            matrix, index = build_retrieval_arrays(vectorstore)
+
+        doc_ids = [vectorstore.index_to_docstore_id[i] for i in range(index.ntotal)]
+        return cls(vectorstore.embedding_function, matrix, index, vectorstore.docstore,
+                   doc_ids, k, score_threshold)
+
+    def embed_query(self, query: str) -> np.ndarray:
+        q = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        return q / np.linalg.norm(q)
+
+    def retrieve(self, query: str) -> List[Document]:
+        """Return up to k chunks most similar to the query, best first."""
+        q = self.embed_query(query)
+        num_candidates = min(max(RERANK_CANDIDATES, self.k), self.index.ntotal)
+        if num_candidates == 0:
+            return []
+        _, ids = self.index.search(q.reshape(1, -1), num_candidates)
+        candidates = ids[0][ids[0] >= 0]
+
+        # Exact fp32 re-rank of the int8 candidates
+        scores = self.matrix[candidates] @ q
+        order = np.argsort(-scores)[:self.k]
+        keep = order[:1].tolist() + [j for j in order[1:] if scores[j] >= self.score_threshold]
+        return [self.docstore.search(self.doc_ids[i]) for i in candidates[keep]]
+
+    async def aretrieve(self, query: str) -> List[Document]:
+        # Embedding + GEMV are CPU-bound and release the GIL in BLAS/torch
+        return await asyncio.to_thread(self.retrieve, query)